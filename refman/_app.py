@@ -1,22 +1,25 @@
-from flask import Flask, render_template
-from flask.helpers import get_root_path
-import pandas as pd
-import numpy as np
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def init_flask_app(references: "pd.DataFrame"):
+    from flask import Flask, render_template
 
-def init_flask_app(references: pd.DataFrame):
     app = Flask("refman")
+    references_html = references.to_html(table_id="references", classes="table table-striped table-hover")
 
     @app.route('/')
     def index():
-        return render_template(
-            "index.html",
-            data=references.to_html(table_id="references", classes="table table-striped table-hover")
-        )
+        return render_template("index.html", data=references_html)
 
     return app
 
 
 if __name__ == "__main__":
+    import numpy as np
+    import pandas as pd
+
     app = init_flask_app(references=pd.DataFrame(np.random.randn(20, 5)))
     app.run(debug=True)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # Taken from:
 # https://github.com/peterwittek/bibpain/blob/master/scripts/bibpain.py
+import functools
 import os
 import re
 import pyperclip
@@ -8,6 +9,9 @@ import requests
 import sys
 import time
 import urllib
+import bibtexparser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from utf8tobibtex import utf8_to_bibtex
 from arxiv2bib import ATOM, arxiv2bib
 
@@ -31,6 +35,16 @@ ARXIV_CATEGORIES = [
     "stat",
 ]
 
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        max_retries=Retry(
+            total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504]
+        )
+    ),
+)
+
 
 def check_categories(text):
     for category in ARXIV_CATEGORIES:
@@ -39,12 +53,13 @@ def check_categories(text):
     return None
 
 
+@functools.lru_cache(maxsize=4096)
 def doi2bib(doi):
     url = "https://doi.org/" + urllib.request.quote(doi)
     header = {
         "Accept": "application/x-bibtex",
     }
-    response = requests.get(url, headers=header)
+    response = SESSION.get(url, headers=header)
     return response.text
 
 
@@ -58,59 +73,51 @@ def get_bibid_for_arxiv(reference):
 def normalize(text_):
     text = utf8_to_bibtex(text_)
     text = text.replace("{{\\textbackslash}hspace{0.167em}}", "")
-    text = text.replace("\t", "  ")
-    text = re.sub('"\n', "}\n", text)
-    text = re.sub('=\w+"', "= {", text)
-    year = None
-    year_line = re.findall("year[^\n]*", text)
-    if year_line != []:
-        year_string = year_line[0]
-        if "{" not in year_string:
-            year = year_string[-5:-1]
-            text = text.replace(
-                year_string, year_string.replace(year, "{" + year + "}")
-            )
-        else:
-            year = year_string[-6:-2]
+    bib = bibtexparser.loads(text, bibtexparser.bparser.BibTexParser(common_strings=True))
+    entry = bib.entries[0]
+    year = entry.get("year")
     first_author = None
-    author_line = re.findall("author[^\n]*", text)
-    if author_line != []:
-        author_list = author_line[0][author_line[0].find("{") + 1 : -2]
-        authors = author_list.split(" and ")
+    if entry.get("author"):
+        authors = entry["author"].split(" and ")
         if "," in authors[0]:
             first_author = authors[0][: authors[0].find(",")]
         else:
-            first_author = authors[0][authors[0].rindex(" ") + 1 :]
-        first_author = first_author.lower()
+            first_author = authors[0].split()[-1]
+        first_author = first_author.strip("{}").lower()
     first_title_word = None
-    title_line = re.findall("title[^\n]*", text)
-    if title_line != []:
-        first_title_word = re.findall("{[A-Za-z]*", title_line[0])[0][1:]
+    if entry.get("title"):
+        first_title_word = re.match("{*([A-Za-z]*)", entry["title"]).group(1)
         first_title_word = first_title_word.lower()
     if first_title_word is not None and first_author is not None and year is not None:
-        original_id = text[text.find("{") + 1 : text.find(",")]
-        new_id = first_author + year + first_title_word
-        text = text.replace(original_id, new_id)
-    if "timestamp" not in text:
-        timestamp = ",\n  timestamp={" + time.strftime("%Y.%m.%d") + "}\n}"
-        text = text[:-2] + timestamp
-    journal_line = re.findall("journal *=[^\n]*", text)
-    if journal_line != []:
-        if "arXiv" in journal_line[0]:
-            text = text.replace(journal_line[0], "archiveprefix = {arXiv},")
-            text = text.replace("https://arxiv.org/abs/", "")
-    month_line = re.findall(" *month *=[^\n]*\n", text)
-    if month_line != []:
-        text = text.replace(month_line[0], "")
-    return text
+        entry["ID"] = first_author + year + first_title_word
+    entry.setdefault("timestamp", time.strftime("%Y.%m.%d"))
+    if "arXiv" in entry.get("journal", ""):
+        del entry["journal"]
+        entry["archiveprefix"] = "arXiv"
+        for field, value in entry.items():
+            entry[field] = value.replace("https://arxiv.org/abs/", "")
+    entry.pop("month", None)
+    return bibtexparser.dumps(bib)
+
+
+FILE_INDEX = {}
+
+
+def file_index(base_dir):
+    if base_dir not in FILE_INDEX:
+        index = {}
+        for root, dirs, files in os.walk(base_dir):
+            for name in files:
+                filename = os.path.join(root, name)
+                index.setdefault(name, filename[len(base_dir) + 1 :])
+        FILE_INDEX[base_dir] = index
+    return FILE_INDEX[base_dir]
 
 
 def find_file(name):
-    base_dir = os.getcwd()
-    for root, dirs, files in os.walk(base_dir):
-        if name in files:
-            filename = os.path.join(root, name)
-            return "	file = {" + filename[len(base_dir) + 1 :] + "},"
+    filename = file_index(os.getcwd()).get(name)
+    if filename is not None:
+        return "	file = {" + filename + "},"
 
 
 def postprocess_arxiv(entry):
@@ -8,12 +8,36 @@ REFMAN_DIR = Path(
 ).absolute()
 PAPER_DIR = REFMAN_DIR / "papers"
 BIB_DB = REFMAN_DIR / "references.csv"
+DB_COLUMNS = [
+    "year",
+    "bibtex_key",
+    "title",
+    "doi",
+    "eprint",
+    "paper_path",
+    "bibtex_path",
+]
 BIB_REF = REFMAN_DIR / "ref.bib"
 META_NAME = "meta.json"
 BIBTEX_NAME = ".bib"
 NOTES_NAME = "notes.org"
+HTTP_CACHE_DIR = REFMAN_DIR / ".http_cache"
+HTTP_CACHE_EXPIRY = 30 * 24 * 60 * 60  # Seconds
+HTTP_TIMEOUT = 30
 CROSSREF_URL = "http://api.crossref.org/works/{doi}/transform/application/{fmt}"
+CROSSREF_WORKS_URL = "https://api.crossref.org/works"
+# Keeps the `filter=doi:...` query string well below the 414 limit
+CROSSREF_BATCH_SIZE = 30
+# Identifying ourselves routes crossref requests into their "polite" pool
+REFMAN_MAILTO = os.getenv("REFMAN_MAILTO")
+CROSSREF_HEADERS = {
+    "User-Agent": "refman (https://github.com/adriancaruana/refman"
+    + (f"; mailto:{REFMAN_MAILTO}" if REFMAN_MAILTO else "")
+    + ")"
+}
 ARXIV_BIBTEX_URL = "https://arxiv.org/bibtex/{arxiv}"
 ARXIV_PDF_URL = "https://arxiv.org/pdf/{arxiv}.pdf"
+DOWNLOAD_WORKERS = 8
+PARSE_WORKERS = int(os.getenv("REFMAN_PARSE_WORKERS", 32))
 FMT_BIBTEX = "x-bibtex"
 FMT_CITEPROC = "citeproc+json"
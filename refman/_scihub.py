@@ -142,11 +142,14 @@ class SciHub(object):
 
         return data
 
-    def fetch(self, identifier):
+    def fetch(self, identifier, stream=False):
         """
         Fetches the paper by first retrieving the direct link to the pdf.
         If the indentifier is a DOI, PMID, or URL pay-wall, then use Sci-Hub
         to access and download paper. Otherwise, just download paper directly.
+        With stream=True, the body is not read: the open response is returned
+        under 'response' instead of the bytes under 'pdf', so that the caller
+        can write it out in chunks.
         """
 
         try:
@@ -157,9 +160,10 @@ class SciHub(object):
             # and requests doesn't know how to download them.
             # as a hacky fix, you can add them to your store
             # and verifying would work. will fix this later.
-            res = self.sess.get(url, verify=False)
+            res = self.sess.get(url, verify=False, stream=stream)
 
             if res.headers["Content-Type"] != "application/pdf":
+                res.close()
                 self._change_base_url()
                 logger.info(
                     "Failed to fetch pdf with identifier %s "
@@ -173,6 +177,8 @@ class SciHub(object):
                 #     'err': 'Failed to fetch pdf with identifier %s (resolved url %s) due to captcha'
                 #            % (identifier, url)
                 # }
+            elif stream:
+                return {"response": res, "url": url}
             else:
                 return {
                     "pdf": res.content,
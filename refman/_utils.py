@@ -2,12 +2,50 @@ import hashlib
 import os
 import re
 import requests
-from functools import reduce
+import shutil
+import threading
+import time
+from typing import TYPE_CHECKING
 
-import bibtexparser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    import json
+    from json import loads as json_loads
 
-PARSER = bibtexparser.bparser.BibTexParser(common_strings=True)
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+from ._constants import (
+    CROSSREF_BATCH_SIZE,
+    CROSSREF_WORKS_URL,
+    CROSSREF_HEADERS,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_EXPIRY,
+    HTTP_TIMEOUT,
+)
+
+if TYPE_CHECKING:
+    from bibtexparser.bibdatabase import BibDatabase
+
+SESSION = requests.Session()
+for prefix in ("http://", "https://"):
+    SESSION.mount(
+        prefix,
+        HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                raise_on_status=False,
+            ),
+        ),
+    )
 
 MONTHS = [
     "jan",
@@ -33,19 +71,34 @@ url_regex = re.compile(
     re.IGNORECASE,
 )
 
-doi_regex = r"\b(10[.][0-9]{4,}(?:[.][0-9]+)*/(?:(?![\"&\'<>])\S)+)\b"
+doi_regex = re.compile(r"10[.][0-9]{4,}(?:[.][0-9]+)*/[^\"&'<>\s]+")
+
+FIELD_SEP = "," + os.linesep
+
+# The citation key of the first entry, e.g. `Foo_2000` in `@article{Foo_2000,`
+entry_key_regex = re.compile(
+    r"@(?!comment|preamble|string)\w+\s*[{(]\s*([^,\s]*)\s*,", re.IGNORECASE
+)
+
+doi_field_regex = re.compile(r"[,{\s]doi\s*=", re.IGNORECASE)
+
+month_regex = re.compile(r"\{(" + "|".join(MONTHS) + r")\}", re.IGNORECASE)
 
 
-def md5_hexdigest(x: str):
-    return hashlib.md5(x.encode("utf-8")).hexdigest()
+def blake2b_hexdigest(x: str):
+    return hashlib.blake2b(x.encode("utf-8"), digest_size=16).hexdigest()
 
 
 def is_valid_url(url: str):
-    return re.match(url_regex, url) is not None
+    return url_regex.fullmatch(url) is not None
 
 
 def is_valid_doi(doi: str):
-    return bool(re.match(doi_regex, doi))
+    return doi_regex.fullmatch(doi) is not None
+
+
+def is_pdf_response(r: requests.Response) -> bool:
+    return "application/pdf" in r.headers.get("Content-Type", "")
 
 
 def ua_requester_get(*args, **kwargs):
@@ -53,69 +106,150 @@ def ua_requester_get(*args, **kwargs):
     ua = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36"
     if "headers" not in kwargs:
         kwargs["headers"] = {"User-Agent": ua}
-    return requests.get(*args, **kwargs)
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    return SESSION.get(*args, **kwargs)
+
+
+def _read_cache(url: str) -> bytes:
+    """Returns the cached body for `url`, or None if it's missing or expired."""
+    cache_path = HTTP_CACHE_DIR / blake2b_hexdigest(url)
+    if (
+        cache_path.exists()
+        and time.time() - cache_path.stat().st_mtime < HTTP_CACHE_EXPIRY
+    ):
+        return cache_path.read_bytes()
+    return None
+
+
+def _write_cache(url: str, content: bytes):
+    HTTP_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+    (HTTP_CACHE_DIR / blake2b_hexdigest(url)).write_bytes(content)
+
+
+def cached_get(url: str, **kwargs) -> bytes:
+    """Returns the body of a GET request to `url`, reusing the copy cached on disk when
+    it is younger than `HTTP_CACHE_EXPIRY`. Only successful responses are cached."""
+    if (content := _read_cache(url)) is not None:
+        return content
+    r = ua_requester_get(url, **kwargs)
+    if not r.ok:
+        raise ValueError(f"Could not get {url}.\nHTTP Response: {r.status_code}")
+    _write_cache(url, r.content)
+    return r.content
+
+
+def atomic_write_bytes(path, data: bytes):
+    """Writes `data` to a temporary file next to `path` and renames it into place, so
+    that `path` is never seen partially written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_response(r: requests.Response, path, chunk_size: int = 1 << 20):
+    """Streams the body of a `stream=True` response into `path` in chunks, so that
+    the whole body is never held in memory."""
+    with r, open(path, "wb") as f:
+        r.raw.decode_content = True
+        shutil.copyfileobj(r.raw, f, length=chunk_size)
+
+
+def crossref_works(dois: list) -> dict:
+    """Fetches the crossref records for all `dois` with batched `filter=doi:` queries.
+    Returns a dict of the records keyed by the lower-cased DOI. Each record is cached
+    on disk by itself, so DOIs seen in earlier batches are not queried again."""
+    works = {}
+    for doi in dois:
+        if (content := _read_cache(f"{CROSSREF_WORKS_URL}/{doi.lower()}")) is not None:
+            works[doi.lower()] = json_loads(content)
+    dois = [doi for doi in dois if doi.lower() not in works]
+    for i in range(0, len(dois), CROSSREF_BATCH_SIZE):
+        batch = dois[i : i + CROSSREF_BATCH_SIZE]
+        r = ua_requester_get(
+            CROSSREF_WORKS_URL,
+            params={
+                "filter": ",".join(f"doi:{doi}" for doi in batch),
+                "rows": len(batch),
+            },
+            headers=CROSSREF_HEADERS,
+        )
+        if not r.ok:
+            raise ValueError(
+                "Could not get works from crossref.\n"
+                f"HTTP Response: {r.status_code}\nURL: {r.url}"
+            )
+        for item in json_loads(r.content)["message"]["items"]:
+            doi = item["DOI"].lower()
+            works[doi] = item
+            _write_cache(f"{CROSSREF_WORKS_URL}/{doi}", json_dumps(item))
+    return works
+
+
+# Building a `BibTexParser` costs more than a parse, so keep one per thread
+_PARSERS = threading.local()
+
+
+def bibtex_loads(bib_str: str) -> "BibDatabase":
+    """Parses `bib_str` with a reusable parser (`common_strings=True`)"""
+    from bibtexparser.bibdatabase import BibDatabase
+    from bibtexparser.bparser import BibTexParser
+
+    parser = getattr(_PARSERS, "parser", None)
+    if parser is None:
+        parser = _PARSERS.parser = BibTexParser(common_strings=True)
+        parser.expect_multiple_parse = True
+    # Parsers accumulate entries across calls, so start from an empty database
+    parser.bib_database = BibDatabase()
+    parser.bib_database.load_common_strings()
+    return parser.parse(bib_str)
 
 
 def fmt_arxiv_bibtex(arxiv_bib_str: str):
     """Ensure consistent formatting of arxiv bibtex files"""
     # My preferred format for ID is: 'FirstSurname_Year'
-    b = bibtexparser.loads(arxiv_bib_str).entries[0]
+    b = bibtex_loads(arxiv_bib_str).entries[0]
     authors = b["author"].split(" and ")
     first_author_surname = authors[0].split(" ")[-1]
     id_fmt = f"{first_author_surname}_{b['year']}"
 
+    eprint = b["eprint"]
+    month = MONTHS[int(eprint[2:4]) - 1]
+    url = f"https://arxiv.org/abs/{eprint}"
+
     lines = ["@article{" + id_fmt]
     for k, v in [
         ("Author", b["author"]),
         ("Title", b["title"]),
-        ("Eprint", b["eprint"]),
+        ("Eprint", eprint),
         ("DOI", b.get("doi", "")),
-        ("Journal", f"arXiv preprint"),
+        ("Journal", "arXiv preprint"),
         # ("Journal", (f"arXiv preprint {ref.category}")),
         ("ArchivePrefix", "arXiv"),
         ("PrimaryClass", b["primaryclass"]),
         ("Year", b["year"]),
-        ("Month", MONTHS[int(b["eprint"][2:4]) - 1]),
-        ("Url", f"https://arxiv.org/abs/{b['eprint']}"),
+        ("Month", month),
+        ("Url", url),
         ("File", id_fmt + ".pdf"),
     ]:
         if len(v):
-            lines.append("    %-13s = {%s}" % (k, v))
+            lines.append(f"    {k:<13} = {{{v}}}")
 
-    return ("," + os.linesep).join(lines) + os.linesep + "}"
+    return FIELD_SEP.join(lines) + os.linesep + "}"
 
 
 def fix_month(bib_str: str) -> str:
     """Fixes the string formatting in a bibtex entry"""
-    return (
-        bib_str.replace("{Jan}", "jan")
-        .replace("{jan}", "jan")
-        .replace("{Feb}", "feb")
-        .replace("{feb}", "feb")
-        .replace("{Mar}", "mar")
-        .replace("{mar}", "mar")
-        .replace("{Apr}", "apr")
-        .replace("{apr}", "apr")
-        .replace("{May}", "may")
-        .replace("{may}", "may")
-        .replace("{Jun}", "jun")
-        .replace("{jun}", "jun")
-        .replace("{Jul}", "jul")
-        .replace("{jul}", "jul")
-        .replace("{Aug}", "aug")
-        .replace("{aug}", "aug")
-        .replace("{Sep}", "sep")
-        .replace("{sep}", "sep")
-        .replace("{Oct}", "oct")
-        .replace("{oct}", "oct")
-        .replace("{Nov}", "nov")
-        .replace("{nov}", "nov")
-        .replace("{Dec}", "dec")
-        .replace("{dec}", "dec")
-    )
+    return month_regex.sub(lambda m: m.group(1).lower(), bib_str)
+
 
 def fix_id(bib_str: str) -> str:
-    _b = bibtexparser.loads(bib_str, parser=PARSER)
+    import bibtexparser
+
+    m = entry_key_regex.search(bib_str)
+    if m is not None and not m.group(1).isnumeric():
+        return bib_str
+    _b = bibtex_loads(bib_str)
     b = _b.entries[0]
     if not b["ID"].isnumeric():
         return bib_str
@@ -126,17 +260,35 @@ def fix_id(bib_str: str) -> str:
     return bibtexparser.dumps(_b)
 
 
+def set_bibtex_key(bib_str: str, key: str) -> str:
+    """Sets the key of the first entry (ensuring it has a DOI field) in place.
+    Returns None if no entry could be found."""
+    m = entry_key_regex.search(bib_str)
+    if m is None:
+        return None
+    head = bib_str[: m.start(1)] + key + bib_str[m.end(1) : m.end()]
+    tail = bib_str[m.end() :]
+    if doi_field_regex.search(tail) is None:
+        head += os.linesep + " DOI = {},"
+    return head + tail
+
+
 def _compose(f, g):
     return lambda *a, **kw: f(g(*a, **kw))
 
 
 def compose(*fs):
-    return lambda x: reduce(lambda acc, f: f(acc), reversed(fs), x)
+    fs = tuple(reversed(fs))
 
+    def composed(x):
+        for f in fs:
+            x = f(x)
+        return x
 
-def fix_bibtex(bibtex: str):
-    fn = compose(
-        fix_month,
-        fix_id,
-    )
-    return fn(bibtex)
+    return composed
+
+
+fix_bibtex = compose(
+    fix_month,
+    fix_id,
+)
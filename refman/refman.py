@@ -1,22 +1,24 @@
 # RefMan - A Simple python-based reference manager.
 # Author: Adrian Caruana (adrian@adriancaruana.com)
 import argparse
+import bisect
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import dataclasses
+import functools
+import glob
 import hashlib
-import json
 import logging
 import os
 from pathlib import Path
 import re
 import shutil
 import subprocess
-from typing import Iterable, List, Tuple
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
 import webbrowser
 
-from arxiv2bib import arxiv2bib
-import bibtexparser
-import pandas as pd
-import pyperclip
+import requests
 from tqdm import tqdm
 import typer
 
@@ -25,31 +27,46 @@ from ._constants import (
     REFMAN_DIR,
     PAPER_DIR,
     BIB_DB,
+    DB_COLUMNS,
     BIB_REF,
     META_NAME,
     BIBTEX_NAME,
     NOTES_NAME,
     CROSSREF_URL,
+    CROSSREF_HEADERS,
     ARXIV_BIBTEX_URL,
     ARXIV_PDF_URL,
     FMT_BIBTEX,
     FMT_CITEPROC,
+    DOWNLOAD_WORKERS,
+    PARSE_WORKERS,
 )
 from ._utils import (
-    md5_hexdigest,
+    atomic_write_bytes,
+    blake2b_hexdigest,
+    bibtex_loads,
     is_valid_url,
     is_valid_doi,
+    is_pdf_response,
     fmt_arxiv_bibtex,
     fix_bibtex,
     ua_requester_get,
+    cached_get,
+    crossref_works,
+    json_dumps,
+    json_loads,
+    save_response,
+    set_bibtex_key,
 )
-from ._app import init_flask_app
-from ._scihub import SciHub
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 STATUS_HANDLER = None
 LOGGER = logging.getLogger(f"refman.{__name__}")
 LOGGER.setLevel(logging.DEBUG)
-SH = SciHub()
+
+DBRow = collections.namedtuple("DBRow", DB_COLUMNS)
 
 APP = typer.Typer(help="RefMan - A Simple python-based reference manager.")
 
@@ -60,14 +77,22 @@ def update_status(msg: str, level_attr: str = "info"):
         # LOGGER.__getattr__(level_attr)
         LOGGER.info(msg)
         return
-    STATUS_HANDLER.set_postfix_str(msg)
+    STATUS_HANDLER.set_postfix_str(msg, refresh=False)
 
 
-def progress_with_status(it: Iterable):
+def progress_with_status(it: Iterable, total: int = None):
     global STATUS_HANDLER
-    ncols = str(min(len(it), 20))
+    total = len(it) if total is None else total
+    if total <= 1:
+        STATUS_HANDLER = None
+        return it
+    ncols = str(min(total, 20))
     barfmt = "{l_bar}{bar:" + ncols + "}{r_bar}{bar:-" + ncols + "b}"
-    return (STATUS_HANDLER := tqdm(it, bar_format=barfmt))
+    return (
+        STATUS_HANDLER := tqdm(
+            it, total=total, bar_format=barfmt, mininterval=0.2, disable=None
+        )
+    )
 
 
 def reset_progress_status_handler():
@@ -75,19 +100,39 @@ def reset_progress_status_handler():
     STATUS_HANDLER = None
 
 
+# `SciHub` drops mirrors from a shared list as they fail, so it isn't thread-safe
+SCI_HUB_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def sci_hub():
+    """Connects to sci-hub on first use, as finding a mirror needs a network round trip."""
+    from ._scihub import SciHub
+
+    return SciHub()
+
+
 @dataclasses.dataclass
 class Paper:
     meta: dict
     bibtex: str
-    pdf_data: bytes = dataclasses.field(default=None)
+    # Either the PDF itself, a streamed response, or a local file to copy it from
+    pdf_data: Union[bytes, requests.Response, Path] = dataclasses.field(default=None)
     notes_data: str = dataclasses.field(default=None)
+    # Where the paper was read from. Papers added before the switch from md5 have
+    # directory names that no longer match the hash of their bibtex.
+    path: Path = dataclasses.field(default=None)
     meta_name: str = dataclasses.field(init=False, default=META_NAME)
     bibtex_name: str = dataclasses.field(init=False, default=BIBTEX_NAME)
     notes_name: str = dataclasses.field(init=False, default=NOTES_NAME)
 
-    @property
+    @functools.cached_property
     def paper_path(self):
-        return REFMAN_DIR / "_".join((self._bibtex_key, md5_hexdigest(self.bibtex)[:7]))
+        if self.path is not None:
+            return self.path
+        return REFMAN_DIR / "_".join(
+            (self._bibtex_key, blake2b_hexdigest(self.bibtex)[:7])
+        )
 
     @property
     def meta_path(self):
@@ -105,7 +150,7 @@ class Paper:
     def notes_path(self):
         return self.paper_path / self.notes_name
 
-    @property
+    @functools.cached_property
     def _bibtex_key(self) -> str:
         return self._bibtex_key_from_bibtex_str(self.meta)
 
@@ -114,93 +159,132 @@ class Paper:
         return meta.get("ID")
 
     @classmethod
-    def _parser(self):
-        return bibtexparser.bparser.BibTexParser(common_strings=True)
-
-    @classmethod
-    def _update_bibtex_str_key(cls, bibtex_str: str, key: str):
-        bib = bibtexparser.loads(bibtex_str, cls._parser())
+    def _update_bibtex_str_key(cls, bibtex_str: str, key: str) -> Tuple[str, dict]:
+        """Returns the re-keyed bibtex string, along with its parsed entry."""
+        import bibtexparser
+
+        new_bibtex_str = set_bibtex_key(bibtex_str, key)
+        if new_bibtex_str is not None:
+            return new_bibtex_str, bibtex_loads(new_bibtex_str).entries[0]
+        bib = bibtex_loads(bibtex_str)
         if not bib.entries[0].get("DOI", False):
             bib.entries[0]["DOI"] = ""
         bib.entries[0]["ID"] = key
-        return bibtexparser.dumps(bib)
+        return bibtexparser.dumps(bib), bib.entries[0]
 
     @classmethod
     def _fix_bibtex_format(cls, bib_str: str) -> str:
         return fix_bibtex(bib_str)
 
+    @classmethod
+    def parse_meta_only(cls, paper_path: Path) -> dict:
+        """Returns only the `meta` of a paper on disk, which is all the DB needs."""
+        update_status(f"{paper_path}: Loading reference from disk.")
+        return json_loads((paper_path / cls.meta_name).read_bytes())
+
     @classmethod
     def parse_from_disk(cls, paper_path: Path, read_pdf: bool = False):
         """Returns a `Paper` object from disk."""
         update_status(f"{paper_path}: Loading reference from disk.")
-        with open(paper_path / cls.meta_name, "r") as f:
-            meta = json.load(f)
+        meta = json_loads((paper_path / cls.meta_name).read_bytes())
         with open(paper_path / cls.bibtex_name, "r") as f:
             bibtex = f.read()
+        file_names = set(os.listdir(paper_path))
         notes = None
-        if (paper_path / cls.notes_name).exists():
+        if cls.notes_name in file_names:
             notes = (paper_path / cls.notes_name).read_text()
         pdf_data = None
         if read_pdf:
-            try:
-                pdf_path = next(paper_path.glob("*.pdf"))
-                update_status(f"{paper_path}: Found {pdf_path.name}.")
-            except StopIteration as e:
+            pdf_name = next((n for n in file_names if n.endswith(".pdf")), None)
+            if pdf_name is None:
                 update_status(f"{paper_path}: No PDF found.")
-            with open(paper_path / pdf_path, "wb") as f:
-                pdf_data = f.read()
-        return cls(meta=meta, bibtex=bibtex, pdf_data=pdf_data, notes_data=notes)
+            else:
+                update_status(f"{paper_path}: Found {pdf_name}.")
+                pdf_data = paper_path / pdf_name
+        return cls(
+            meta=meta,
+            bibtex=bibtex,
+            pdf_data=pdf_data,
+            notes_data=notes,
+            path=paper_path,
+        )
 
     @classmethod
     def new_paper_from_arxiv(cls, arxiv: str, key: str = None):
         """Adds a new paper to the `papers` dir from an arxiv str"""
-        update_status(f"{arxiv=}: Retrieving bibtex entry.")
-        bib_str = ua_requester_get(ARXIV_BIBTEX_URL.format(arxiv=arxiv)).content.decode(
-            "utf-8"
-        )
-        bib_str = fmt_arxiv_bibtex(bib_str)
-        bib_str = cls._fix_bibtex_format(bib_str)
-        # Set custom key if requested
-        if key is not None:
-            bib_str = cls._update_bibtex_str_key(bib_str, key)
-        meta = dict(bibtexparser.loads(bib_str, cls._parser()).entries[0])
-        update_status(f"{arxiv=}: Retrieving PDF.")
-        pdf_data = ua_requester_get(ARXIV_PDF_URL.format(arxiv=arxiv)).content
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            update_status(f"{arxiv=}: Retrieving PDF.")
+            pdf_future = pool.submit(
+                ua_requester_get, ARXIV_PDF_URL.format(arxiv=arxiv), stream=True
+            )
+            update_status(f"{arxiv=}: Retrieving bibtex entry.")
+            try:
+                bib_str = ua_requester_get(
+                    ARXIV_BIBTEX_URL.format(arxiv=arxiv)
+                ).content.decode("utf-8")
+                bib_str = fmt_arxiv_bibtex(bib_str)
+                bib_str = cls._fix_bibtex_format(bib_str)
+                # Set custom key if requested
+                if key is not None:
+                    bib_str, meta = cls._update_bibtex_str_key(bib_str, key)
+                else:
+                    meta = bibtex_loads(bib_str).entries[0]
+            except Exception:
+                if pdf_future.exception() is None:
+                    pdf_future.result().close()
+                raise
+            pdf_data = pdf_future.result()
         paper = cls(meta=meta, bibtex=bib_str, pdf_data=pdf_data)
         paper.to_disk()
         return paper
 
     @classmethod
-    def new_paper_from_doi(cls, doi: str, key: str = None, pdf: str = None):
-        """Adds a new paper to the `papers` dir from a DOI"""
+    def new_paper_from_doi(
+        cls,
+        doi: str,
+        key: str = None,
+        pdf: str = None,
+        citeproc_json: dict = None,
+    ):
+        """Adds a new paper to the `papers` dir from a DOI.
+        Optionally: Skip the crossref lookup by passing an already fetched `citeproc_json`
+        """
         # Fetch the reference data from cross-ref
         if not is_valid_doi(doi):
             raise ValueError(f"Provided {doi=} is not a valid DOI.")
-        update_status(f"{doi=}: Retrieving structured reference info.")
-        r = ua_requester_get((url := CROSSREF_URL.format(doi=doi, fmt=FMT_CITEPROC)))
-        if not r.ok:
-            raise ValueError(
-                "Could not get citeproc+json from crossref.\n"
-                f"HTTP Response: {r.status_code}\nDOI: {doi}\nURL: {url}"
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            update_status(f"{doi=}: Retrieving bibtex entry.")
+            bib_future = pool.submit(
+                cached_get,
+                CROSSREF_URL.format(doi=doi.lower(), fmt=FMT_BIBTEX),
+                headers=CROSSREF_HEADERS,
             )
-        citeproc_json = dict(r.json())
-        update_status(f"{doi=}: Retrieving bibtex entry.")
-        bib_str = cls._fix_bibtex_format(
-            ua_requester_get(
-                CROSSREF_URL.format(doi=doi.lower(), fmt=FMT_BIBTEX)
-            ).content.decode("utf-8")
-        )
-        update_status(f"{doi=}: Retrieving PDF.")
-        pdf_data = None
-        if pdf is not None:
-            pdf_data = cls._get_pdf_data_from_path(pdf_path=str(pdf))
-        if pdf_data is None:
-            pdf_data = cls._get_pdf_data_from_doi(doi, citeproc_json)
-        # Set custom key if requested
-        if key is not None:
-            bib_str = cls._update_bibtex_str_key(bib_str, key)
+            if citeproc_json is None:
+                update_status(f"{doi=}: Retrieving structured reference info.")
+                citeproc_json = json_loads(
+                    cached_get(
+                        CROSSREF_URL.format(doi=doi, fmt=FMT_CITEPROC),
+                        headers=CROSSREF_HEADERS,
+                    )
+                )
+            update_status(f"{doi=}: Retrieving PDF.")
+            pdf_data = None
+            if pdf is not None:
+                pdf_data = cls._get_pdf_data_from_path(pdf_path=str(pdf))
+            if pdf_data is None:
+                pdf_data = cls._get_pdf_data_from_doi(doi, citeproc_json)
+            try:
+                bib_str = cls._fix_bibtex_format(bib_future.result().decode("utf-8"))
+                # Set custom key if requested
+                if key is not None:
+                    bib_str, meta = cls._update_bibtex_str_key(bib_str, key)
+                else:
+                    meta = bibtex_loads(bib_str).entries[0]
+            except Exception:
+                if isinstance(pdf_data, requests.Response):
+                    pdf_data.close()
+                raise
         # Prepare the Paper object
-        meta = dict(bibtexparser.loads(bib_str, cls._parser()).entries[0])
         paper = Paper(meta=meta, bibtex=bib_str, pdf_data=pdf_data)
         paper.to_disk()
         return paper
@@ -217,10 +301,10 @@ class Paper:
         """
         # Set custom key if requested
         if key is not None:
-            bibtex_str = cls._update_bibtex_str_key(bibtex_str, key)
+            bibtex_str, _ = cls._update_bibtex_str_key(bibtex_str, key)
         bibtex_str = cls._fix_bibtex_format(bibtex_str)
-        bib = bibtexparser.loads(bibtex_str, cls._parser())
-        meta = dict(bib.entries[0])
+        bib = bibtex_loads(bibtex_str)
+        meta = bib.entries[0]
         bibtex_key = cls._bibtex_key_from_bibtex_str(meta)
         LOGGER.info(f"{bibtex_key}: Parsing BibTeX string.")
         pdf_data = None
@@ -231,27 +315,29 @@ class Paper:
         return paper
 
     @classmethod
-    def _get_pdf_data_from_path(cls, pdf_path: str) -> bytes:
+    def _get_pdf_data_from_path(cls, pdf_path: str) -> Union[requests.Response, Path]:
         LOGGER.info(f"Getting PDF from path.")
         pdf_data = None
         if is_valid_url(pdf_path):
-            r = ua_requester_get(pdf_path)
-            if "application/pdf" not in r.headers["Content-Type"]:
+            r = ua_requester_get(pdf_path, stream=True)
+            if not is_pdf_response(r):
                 LOGGER.warning(f"{pdf_path} did not contain a PDF.")
+                r.close()
                 pdf_data = None
             else:
                 LOGGER.info(f"Got PDF from URL.")
-                pdf_data = r.content
+                pdf_data = r
         else:
             if pdf_path is not None and Path(pdf_path).exists():
-                with open(pdf_path, "rb") as f:
-                    LOGGER.info(f"Got PDF from DISK.")
-                    pdf_data = f.read()
+                LOGGER.info(f"Got PDF from DISK.")
+                pdf_data = Path(pdf_path)
 
         return pdf_data
 
     @classmethod
-    def _get_pdf_data_from_doi(cls, doi: str, citeproc_json: dict) -> bytes:
+    def _get_pdf_data_from_doi(
+        cls, doi: str, citeproc_json: dict
+    ) -> Union[bytes, requests.Response]:
         # Try to download from other available sources before sci-hub
         if "link" in citeproc_json.keys():
             update_status(f"{doi=}: Found PDF link from crossref, attempting download.")
@@ -261,11 +347,13 @@ class Paper:
                     for l in citeproc_json["link"]
                     if l["content-type"] == "application/pdf"
                 )
-                r = ua_requester_get(link)
-                if "application/pdf" not in r.headers["Content-Type"]:
+                r = ua_requester_get(link, stream=True)
+                if not is_pdf_response(r):
+                    # Paywalled links often serve an HTML page, so don't download it
+                    r.close()
                     raise TypeError(f"Link did not contain a PDF.")
                 update_status(f"{doi=}: Got PDF from CITEPROC.")
-                return r.content
+                return r
             except StopIteration as e:
                 update_status(
                     f"{doi=}: While citeproc+json contains link(s), none link to a PDF."
@@ -278,7 +366,8 @@ class Paper:
         # Download the PDF using sci-hub
         update_status(f"{doi=}: Falling back to sci-hub for PDF retrieval.")
         try:
-            pdf_data = SH.fetch(doi)["pdf"]
+            with SCI_HUB_LOCK:
+                pdf_data = sci_hub().fetch(doi, stream=True)["response"]
             update_status(f"{doi=}: Got PDF from SCI-HUB.")
             return pdf_data
         except Exception as e:
@@ -288,58 +377,187 @@ class Paper:
             )
         return bytes()
 
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path):
+        # A PDF already in the library is only moving (e.g. on rekey), so link it.
+        # Others are copied, so later changes to them don't leak into the library.
+        if REFMAN_DIR.resolve() in src.resolve().parents:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass  # E.g. a filesystem without hardlinks; fall back to a copy
+        shutil.copyfile(src, dst)
+
     def to_disk(self):
         self.paper_path.mkdir(exist_ok=True, parents=True)
-        with open(self.meta_path, "w") as f:
-            json.dump(self.meta, f)
         with open(self.bibtex_path, "w") as f:
             f.write(self.bibtex)
         if self.notes_data is not None and len(self.notes_data) > 0:
             with open(self.notes_path, "w") as f:
                 f.write(self.notes_data)
-        if self.pdf_data is not None and len(self.pdf_data) > 0:
+        if isinstance(self.pdf_data, requests.Response):
+            save_response(self.pdf_data, self.pdf_path)
+        elif isinstance(self.pdf_data, Path):
+            if self.pdf_data != self.pdf_path:
+                self._link_or_copy(self.pdf_data, self.pdf_path)
+        elif self.pdf_data is not None and len(self.pdf_data) > 0:
             with open(self.pdf_path, "wb") as f:
                 f.write(self.pdf_data)
+        # A directory is only picked up as a paper once it has a meta file, so write
+        # that last, and atomically, so an interrupted add never leaves a partial paper
+        atomic_write_bytes(self.meta_path, json_dumps(self.meta))
 
 
 @dataclasses.dataclass
 class RefMan:
-    db: pd.DataFrame = dataclasses.field(init=False, default=None)
+    _db: "pd.DataFrame" = dataclasses.field(init=False, default=None)
+    # Rows added since `db` was last read
+    _pending: List[DBRow] = dataclasses.field(init=False, default_factory=list)
+    # Lower-cased `doi`/`eprint` values mapped to their rows, built on first lookup
+    _index: Dict[str, Dict[str, DBRow]] = dataclasses.field(
+        init=False, default_factory=dict
+    )
+    # Sorted names of the paper directories in `db`, built on first prefix search
+    _names: Optional[List[str]] = dataclasses.field(init=False, default=None)
+    # Whether papers were removed from `db` since `BIB_REF` was last written
+    _bib_ref_stale: bool = dataclasses.field(init=False, default=False)
 
     def __post_init__(self):
+        import pandas as pd
+
         if not os.getenv("REFMAN_DATA", False):
             LOGGER.warning(
                 f"`REFMAN_DATA` not found in environment variables. Using '{REFMAN_DIR}' as data path."
             )
         REFMAN_DIR.mkdir(exist_ok=True, parents=True)
+        cached_rows, cache_mtime_ns = None, 0
+        if BIB_DB.exists():
+            LOGGER.info(f"Loading database from '{BIB_DB}'.")
+            cache_mtime_ns = BIB_DB.stat().st_mtime_ns
+            try:
+                db = pd.read_csv(BIB_DB, dtype=str, keep_default_na=False)
+            except ValueError:  # E.g. pandas' EmptyDataError for an empty file
+                db = None
+            if db is None or not set(DB_COLUMNS).issubset(db.columns):
+                LOGGER.warning(f"Couldn't read '{BIB_DB}'. Rebuilding it.")
+            elif not db["paper_path"].str.startswith(str(REFMAN_DIR)).all():
+                LOGGER.info(f"'{BIB_DB}' refers to another data path. Ignoring it.")
+            else:
+                self.db = db
+                cached_rows = {
+                    row.paper_path: row
+                    for row in self.db[DB_COLUMNS].itertuples(index=False, name="DBRow")
+                }
+        meta_mtimes = self._paper_meta_mtimes()
+        paper_paths = list(meta_mtimes)
+        # Only papers that are new, or whose meta changed since the cache was
+        # written, need to be read from disk again
+        rows = {}
+        for path in paper_paths:
+            row = (cached_rows or {}).get(str(path))
+            if row is not None and meta_mtimes[path] <= cache_mtime_ns:
+                rows[path] = row
+        stale_paths = [path for path in paper_paths if path not in rows]
+        unchanged = cached_rows is not None and len(rows) == len(cached_rows)
+        if unchanged and not stale_paths:
+            return
         LOGGER.info("Parsing database.")
-        paper_paths = self._paper_paths_list()
-        if len(paper_paths) > 0:
-            path_it = progress_with_status(paper_paths)
-            papers = list(map(Paper.parse_from_disk, path_it))
+        if len(stale_paths) > 0:
+            with ThreadPoolExecutor(
+                max_workers=min(PARSE_WORKERS, len(stale_paths))
+            ) as pool:
+                metas = list(
+                    progress_with_status(
+                        pool.map(Paper.parse_meta_only, stale_paths),
+                        total=len(stale_paths),
+                    )
+                )
             reset_progress_status_handler()
-            self.db = pd.DataFrame(map(self._get_paper_meta, papers))
+            for meta, path in zip(metas, stale_paths):
+                rows[path] = self._db_row(meta, path)
+        if len(rows) > 0:
+            self.db = pd.DataFrame.from_records(
+                [rows[path] for path in paper_paths], columns=DB_COLUMNS
+            )
         else:
-            self.db = pd.DataFrame(None)
-
-    def _paper_paths_list(self):
-        return list(map(lambda x: x.parent, REFMAN_DIR.rglob(META_NAME)))
+            # Keep the columns so lookups on an empty DB don't raise a KeyError
+            self.db = pd.DataFrame(columns=DB_COLUMNS)
+        self._save_db_cache()
+
+    def _save_db_cache(self):
+        atomic_write_bytes(BIB_DB, self.db.to_csv(index=False).encode())
+
+    def _paper_meta_mtimes(self) -> Dict[Path, int]:
+        """Maps the directory of every paper to the mtime (in ns) of its meta file."""
+        meta_mtimes = {}
+        # Papers are only ever stored one level below `REFMAN_DIR`
+        with os.scandir(REFMAN_DIR) as it:
+            for entry in it:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                try:
+                    meta_stat = os.stat(os.path.join(entry.path, META_NAME))
+                except FileNotFoundError:
+                    continue
+                meta_mtimes[Path(entry.path)] = meta_stat.st_mtime_ns
+        return meta_mtimes
+
+    def _get_paper_meta(self, paper: Paper) -> DBRow:
+        return self._db_row(paper.meta, paper.paper_path)
+
+    @staticmethod
+    def _db_row(meta: dict, paper_path: Path) -> DBRow:
+        return DBRow(
+            year=meta.get("year", ""),
+            bibtex_key=str(Paper._bibtex_key_from_bibtex_str(meta)),
+            title=meta.get("title", ""),
+            doi=meta.get("doi", "").lower(),  # For parsing via DOI
+            eprint=meta.get("eprint", ""),  # For parsing via arxiv,
+            paper_path=str(paper_path),
+            bibtex_path=str(paper_path / BIBTEX_NAME),
+        )
 
-    def _get_paper_meta(self, paper: Paper) -> dict:
-        return {
-            "year": paper.meta.get("year", ""),
-            "bibtex_key": str(paper._bibtex_key),
-            "title": paper.meta.get("title", ""),
-            "doi": paper.meta.get("doi", "").lower(),  # For parsing via DOI
-            "eprint": paper.meta.get("eprint", ""),  # For parsing via arxiv,
-            "paper_path": str(paper.paper_path),
-            "bibtex_path": str(paper.bibtex_path),
-        }
+    def append_to_db(self, *papers: Paper):
+        rows = list(map(self._get_paper_meta, papers))
+        for column, index in self._index.items():
+            index.update((getattr(row, column).lower(), row) for row in rows)
+        if self._names is not None:
+            for row in rows:
+                bisect.insort(self._names, Path(row.paper_path).name)
+        self._pending.extend(rows)
 
-    def append_to_db(self, paper: Paper):
-        self.db = pd.concat([self.db, pd.DataFrame([self._get_paper_meta(paper)])])
+    @property
+    def db(self) -> "pd.DataFrame":
+        self._flush_pending()
+        return self._db
+
+    @db.setter
+    def db(self, db: "pd.DataFrame"):
+        self._index.clear()
+        self._names = None
+        self._db = db
+
+    def _lookup(self, column: str, value: str) -> Optional[DBRow]:
+        """O(1) lookup of the row of the paper with this `doi`/`eprint`."""
+        if column not in self._index:
+            rows = self.db[DB_COLUMNS].itertuples(index=False, name="DBRow")
+            self._index[column] = {getattr(row, column).lower(): row for row in rows}
+        return self._index[column].get(value.lower())
+
+    def _flush_pending(self):
+        import pandas as pd
+
+        if len(self._pending) == 0:
+            return
+        self._db = pd.concat(
+            [self._db, pd.DataFrame.from_records(self._pending, columns=DB_COLUMNS)],
+            ignore_index=True,
+        )
+        self._pending.clear()
 
     def remove_from_db(self, column: str, value: str):
+        self._bib_ref_stale = True
         self.db = self.db[self.db[column] != value]
 
     def add_using_arxiv(self, arxiv: str, key: str = None):
@@ -350,11 +568,10 @@ class RefMan:
             or arxiv[4] != "."
         ):
             raise ValueError(f"Invalid {arxiv=}")
-        if arxiv in list(self.db.get("eprint", list())):
+        row = self._lookup("eprint", arxiv)
+        if row is not None:
             logging.info(f"{arxiv=} already in DB. Nothing to do.")
-            path = self.db[self.db["eprint"] == arxiv.lower()].iloc[0]["paper_path"]
-            paper = Paper.parse_from_disk(Path(path))
-            return paper.meta.get("ID", "")
+            return row.bibtex_key
         paper = Paper.new_paper_from_arxiv(arxiv, key)
         self.append_to_db(paper)
         self._update_db()
@@ -363,16 +580,68 @@ class RefMan:
     def add_using_doi(self, doi: str, key: str, pdf: str):
         if not doi:
             raise ValueError(f"Invalid: {doi=}")
-        if doi.lower() in list(self.db.get("doi", list())):
+        row = self._lookup("doi", doi)
+        if row is not None:
             logging.info(f"{doi=} already in DB. Nothing to do.")
-            path = self.db[self.db["doi"] == doi.lower()].iloc[0]["paper_path"]
-            paper = Paper.parse_from_disk(Path(path))
-            return paper.meta.get("ID", "")
+            return row.bibtex_key
         paper = Paper.new_paper_from_doi(doi, key, pdf)
         self.append_to_db(paper)
         self._update_db()
         return paper.meta.get("ID", "")
 
+    def add_using_dois(self, dois: List[str]):
+        if not dois or not all(dois):
+            raise ValueError(f"Invalid: {dois=}")
+        for doi in dois:
+            if not is_valid_doi(doi):
+                raise ValueError(f"Provided {doi=} is not a valid DOI.")
+        # DOIs are case-insensitive, so keep only the first spelling of each
+        unique_dois = {}
+        for doi in dois:
+            unique_dois.setdefault(doi.lower(), doi)
+        citations = {}
+        for doi in unique_dois.values():
+            row = self._lookup("doi", doi)
+            if row is not None:
+                logging.info(f"{doi=} already in DB. Nothing to do.")
+                citations[doi.lower()] = row.bibtex_key
+        new_dois = [doi for doi in unique_dois.values() if doi.lower() not in citations]
+        if len(new_dois) > 0:
+            LOGGER.info(f"Retrieving crossref records for {len(new_dois)} DOIs.")
+            works = crossref_works(new_dois)
+            with ThreadPoolExecutor(
+                max_workers=min(DOWNLOAD_WORKERS, len(new_dois))
+            ) as pool:
+                futures = {
+                    doi: pool.submit(
+                        Paper.new_paper_from_doi,
+                        doi,
+                        citeproc_json=works.get(doi.lower()),
+                    )
+                    for doi in new_dois
+                }
+                new_papers, failures = [], {}
+                for doi in progress_with_status(futures):
+                    try:
+                        paper = futures[doi].result()
+                    except Exception as e:
+                        failures[doi] = e
+                        continue
+                    new_papers.append(paper)
+                    citations[doi.lower()] = paper.meta.get("ID", "")
+            reset_progress_status_handler()
+            if len(new_papers) > 0:
+                self.append_to_db(*new_papers)
+                self._update_db()
+            if len(failures) > 0:
+                for doi, e in failures.items():
+                    LOGGER.error(f"Failed to add {doi=}. Reason: {str(e)}")
+                raise RuntimeError(
+                    f"Failed to add {len(failures)} of {len(new_dois)} DOIs: "
+                    f"{list(failures)}"
+                ) from next(iter(failures.values()))
+        return [citations[doi.lower()] for doi in dois]
+
     def add_using_bibtex(self, bibtex_str: str, pdf_path: str, key: str = None):
         paper = Paper.new_paper_from_bibtex(
             bibtex_str=bibtex_str, pdf_path=pdf_path, key=key
@@ -381,8 +650,23 @@ class RefMan:
         self._update_db()
         return paper.meta.get("ID", "")
 
+    def _find_by_prefix(self, prefix: str) -> List[Path]:
+        """Paper directories whose name starts with `prefix`, found by bisection."""
+        if glob.has_magic(prefix):
+            paths = REFMAN_DIR.glob(prefix + "*")
+            return [p for p in paths if (p / META_NAME).exists()]
+        if self._names is None:
+            self._names = sorted(Path(p).name for p in self.db["paper_path"])
+        # Names sharing the prefix sit contiguously from its insertion point
+        matches = []
+        for name in self._names[bisect.bisect_left(self._names, prefix) :]:
+            if not name.startswith(prefix):
+                break
+            matches.append(REFMAN_DIR / name)
+        return matches
+
     def rekey(self, key: str, new_key: str):
-        paper_path_li = list(REFMAN_DIR.glob(key + "*"))
+        paper_path_li = self._find_by_prefix(key)
         if len(paper_path_li) > 1:
             raise ValueError(
                 f"Multiple papers matching wildcard: {key + '*'}.\n{paper_path_li=}."
@@ -403,7 +687,7 @@ class RefMan:
         return new_paper.meta.get("ID", "")
 
     def meta_edit(self, key: str):
-        paper_path_li = list(REFMAN_DIR.glob(key + "*"))
+        paper_path_li = self._find_by_prefix(key)
         if len(paper_path_li) > 1:
             raise ValueError(
                 f"Multiple papers matching wildcard: {key + '*'}.\n{paper_path_li=}."
@@ -417,7 +701,10 @@ class RefMan:
         subprocess.call([EDITOR, old_paper.bibtex_path])
         with open(old_paper.bibtex_path, "r") as f:
             new_bibtex = f.read()
-        if new_bibtex == old_paper.bibtex:
+        # Compare the parsed entries, so an edit to only the formatting is a no-op too
+        if new_bibtex == old_paper.bibtex or (
+            bibtex_loads(new_bibtex).entries == bibtex_loads(old_paper.bibtex).entries
+        ):
             LOGGER.warning(
                 "You didn't modify the bibtex! "
                 "Therefore, there is nothing to do, because the metadata hasn't changed."
@@ -443,7 +730,7 @@ class RefMan:
                 raise ValueError(
                     f"Found no papers matching {key=}, and {allow_wildcard=}. Exiting."
                 )
-            paper_path_li = list(REFMAN_DIR.glob(key + "*"))
+            paper_path_li = self._find_by_prefix(key)
             if len(paper_path_li) > 1:
                 raise ValueError(
                     f"Multiple papers matching wildcard: {key + '*'}.\n{paper_path_li=}."
@@ -460,11 +747,37 @@ class RefMan:
         self._update_db()
 
     def _update_db(self):
+        new_bibtex_paths = [row.bibtex_path for row in self._pending]
+        # `BIB_REF` is always written after `BIB_DB`, so if it's older, `BIB_DB` was
+        # rebuilt since (e.g. a paper was removed by hand), and appending isn't enough
+        rewrite = (
+            self._bib_ref_stale
+            or not BIB_REF.exists()
+            or not BIB_DB.exists()
+            or BIB_REF.stat().st_mtime_ns < BIB_DB.stat().st_mtime_ns
+        )
+        self._save_db_cache()
         # Write out bibliography file
-        LOGGER.info(f"Writing bibliography file to '{BIB_REF}'.")
-        with open(BIB_REF, "w") as f:
-            for paper_bibtex in self.db["bibtex_path"]:
-                f.write(open(paper_bibtex, "r").read() + "\n")
+        if rewrite:
+            LOGGER.info(f"Writing bibliography file to '{BIB_REF}'.")
+            self._write_bib_ref(self.db["bibtex_path"].tolist(), mode="wb")
+            self._bib_ref_stale = False
+        else:
+            LOGGER.info(f"Appending to bibliography file '{BIB_REF}'.")
+            self._write_bib_ref(new_bibtex_paths, mode="ab")
+
+    def _write_bib_ref(self, bibtex_paths: List[str], mode: str):
+        with open(BIB_REF, mode) as f:
+            for paper_bibtex in bibtex_paths:
+                with open(paper_bibtex, "rb") as src:
+                    shutil.copyfileobj(src, f)
+                f.write(b"\n")
+
+
+def copy_citation(*keys: str):
+    import pyperclip
+
+    pyperclip.copy(f"\\cite{{{','.join(keys)}}}")
 
 
 @APP.command()
@@ -476,7 +789,23 @@ def doi(
     """Tries to find and download the paper using the DOI."""
     typer.echo(f"Adding new paper from {doi=}")
     new_citation = RefMan().add_using_doi(doi=doi, key=key, pdf=pdf)
-    pyperclip.copy(f"\cite{{{new_citation}}}")
+    copy_citation(new_citation)
+
+
+@APP.command()
+def dois(
+    dois: List[str] = typer.Argument(None),
+    file: Path = typer.Option(
+        None, "--file", "-f", help="A file of DOIs, one per line."
+    ),
+):
+    """Tries to find and download several papers at once using their DOIs."""
+    dois = list(dois or [])
+    if file is not None:
+        dois += [line.strip() for line in file.read_text().splitlines() if line.strip()]
+    typer.echo(f"Adding {len(dois)} new papers from DOIs")
+    new_citations = RefMan().add_using_dois(dois=dois)
+    copy_citation(*new_citations)
 
 
 @APP.command()
@@ -484,7 +813,7 @@ def arxiv(arxiv: str, key: str = typer.Option(None, "--key", "-k")):
     """Gets the paper from an Arxiv reference string"""
     typer.echo(f"Adding new paper from {arxiv=}")
     new_citation = RefMan().add_using_arxiv(arxiv=arxiv, key=key)
-    pyperclip.copy(f"\cite{{{new_citation}}}")
+    copy_citation(new_citation)
 
 
 @APP.command()
@@ -496,21 +825,21 @@ def bibtex(
     """Adds an entry to the database from a bibtex-string."""
     typer.echo(f"Adding new paper from bibtex.")
     new_citation = RefMan().add_using_bibtex(bibtex_str=bibtex, key=key, pdf_path=pdf)
-    pyperclip.copy(f"\cite{{{new_citation}}}")
+    copy_citation(new_citation)
 
 
 @APP.command()
 def rekey(key: str, new_key: str):
     """Modify the key of a paper."""
     new_citation = RefMan().rekey(key=key, new_key=new_key)
-    pyperclip.copy(f"\cite{{{new_citation}}}")
+    copy_citation(new_citation)
 
 
 @APP.command()
 def medit(key: str):
     """Interactively modify the metadata of a paper."""
     new_citation = RefMan().meta_edit(key=key)
-    pyperclip.copy(f"\cite{{{new_citation}}}")
+    copy_citation(new_citation)
 
 
 @APP.command()
@@ -523,6 +852,8 @@ def rm(key: str):
 @APP.command()
 def app():
     """Starts the RefMan Server for viewing references."""
+    from ._app import init_flask_app
+
     typer.echo(f"Starting the RefMan Viewer app.")
     refman = RefMan()
     flask_app = init_flask_app(references=refman.db)
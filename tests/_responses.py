@@ -1,5 +1,8 @@
+import functools
 from pathlib import Path
 
+import responses
+
 from refman._constants import (
     EDITOR,
     REFMAN_DIR,
@@ -9,6 +12,7 @@ from refman._constants import (
     META_NAME,
     BIBTEX_NAME,
     CROSSREF_URL,
+    CROSSREF_WORKS_URL,
     ARXIV_BIBTEX_URL,
     ARXIV_PDF_URL,
     FMT_BIBTEX,
@@ -16,6 +20,15 @@ from refman._constants import (
 )
 
 
+TEST_PDF_PATH = Path(__file__).parent / "test.pdf"
+
+
+@functools.lru_cache(maxsize=None)
+def read_test_pdf() -> bytes:
+    """The bytes of `test.pdf`, read once, and only by tests that need them."""
+    return TEST_PDF_PATH.read_bytes()
+
+
 DOI = "10.1146/annurev-statistics-031017-100045"
 DOI_RESPONSES = {
     CROSSREF_URL.format(
@@ -26,15 +39,20 @@ DOI_RESPONSES = {
     ): b"@article{Wasserman_2018,\n\tdoi = {10.1146/annurev-statistics-031017-100045},\n\turl = {https://doi.org/10.1146%2Fannurev-statistics-031017-100045},\n\tyear = 2018,\n\tmonth = {mar},\n\tpublisher = {Annual Reviews},\n\tvolume = {5},\n\tnumber = {1},\n\tpages = {501--532},\n\tauthor = {Larry Wasserman},\n\ttitle = {Topological Data Analysis},\n\tjournal = {Annual Review of Statistics and Its Application}\n}",
 }
 
+DOIS_RESPONSES = {
+    **DOI_RESPONSES,
+    CROSSREF_WORKS_URL: b'{"status":"ok","message-type":"work-list","message":{"items":['
+    + DOI_RESPONSES[CROSSREF_URL.format(doi=DOI, fmt=FMT_CITEPROC)]
+    + b"]}}",
+}
+
 
 ARXIV = "2104.13478"
 ARXIV_RESPONSES = {
     ARXIV_BIBTEX_URL.format(
         arxiv=ARXIV
     ): b"@misc{bronstein2021geometric,\n      title={Geometric Deep Learning: Grids, Groups, Graphs, Geodesics, and Gauges}, \n      author={Michael M. Bronstein and Joan Bruna and Taco Cohen and Petar Veli\xc4\x8dkovi\xc4\x87},\n      year={2021},\n      eprint={2104.13478},\n      archivePrefix={arXiv},\n      primaryClass={cs.LG}\n}",
-    ARXIV_PDF_URL.format(arxiv=ARXIV): open(
-        str(Path(__file__).parent / "test.pdf"), "rb"
-    ).read(),
+    ARXIV_PDF_URL.format(arxiv=ARXIV): read_test_pdf,
 }
 
 BIBTEX = """
@@ -52,3 +70,21 @@ BIBTEX = """
 	journal = {Annual Review of Statistics and Its Application}
 }
 """
+
+
+def _as_response(url: str, body) -> responses.BaseResponse:
+    if callable(body):
+        # Produce the body when the URL is first requested, rather than at import
+        return responses.CallbackResponse(
+            responses.GET, url, callback=lambda request: (200, {}, body())
+        )
+    return responses.Response(responses.GET, url, body=body, status=200)
+
+
+def _as_responses(url_bodies: dict) -> list:
+    return [_as_response(url, body) for url, body in url_bodies.items()]
+
+
+# Built once, and registered for the whole session by `conftest.mocked_http`
+DOIS_RESPONSE_OBJS = _as_responses(DOIS_RESPONSES)
+ARXIV_RESPONSE_OBJS = _as_responses(ARXIV_RESPONSES)
@@ -0,0 +1,41 @@
+import os
+from pathlib import Path
+
+import pyperclip
+import pytest
+import responses
+
+REFMAN_DATA = Path(__file__).parent / "TEST_REFMAN_DATA"
+
+
+def pytest_configure(config):
+    # refman reads this when it's first imported, so set it before collection.
+    # Always overridden, so the tests never touch a real library.
+    os.environ["REFMAN_DATA"] = str(REFMAN_DATA)
+
+
+@pytest.fixture(autouse=True)
+def fake_clipboard(monkeypatch):
+    # An in-memory clipboard, so tests don't shell out to xclip/xsel (or need one)
+    clipboard = [""]
+    monkeypatch.setattr(pyperclip, "copy", lambda text: clipboard.__setitem__(0, text))
+    monkeypatch.setattr(pyperclip, "paste", lambda: clipboard[0])
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _requests_mock():
+    # Active for every test, so none of them can reach the network. `_responses` is
+    # imported here, so refman is only imported after `pytest_configure`.
+    from ._responses import ARXIV_RESPONSE_OBJS, DOIS_RESPONSE_OBJS
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        for response in (*DOIS_RESPONSE_OBJS, *ARXIV_RESPONSE_OBJS):
+            rsps.add(response)
+        yield rsps
+
+
+@pytest.fixture
+def mocked_http(_requests_mock):
+    """Mocks every crossref/arxiv URL the tests use, with a fresh list of calls."""
+    _requests_mock.calls.reset()
+    yield _requests_mock
@@ -1,19 +1,13 @@
+import json
 import os
-import sys
 from pathlib import Path
-import hashlib
 import pytest
 import shutil
 import subprocess
 import signal
 
-import responses
 import pyperclip
 
-REFMAN_DATA = Path(__file__).parent / "TEST_REFMAN_DATA"
-os.environ["REFMAN_DATA"] = str(REFMAN_DATA)
-sys.path.append(str((Path(__file__).parent / "../").resolve().absolute()))
-
 from refman._constants import (
     EDITOR,
     REFMAN_DIR,
@@ -28,14 +22,34 @@ from refman._constants import (
     FMT_BIBTEX,
     FMT_CITEPROC,
 )
-from refman.refman import doi, arxiv, bibtex, rekey, medit, rm
+from refman.refman import Paper, RefMan, doi, dois, arxiv, bibtex, rekey, medit, rm
+
+from ._responses import (
+    DOI,
+    ARXIV,
+    BIBTEX,
+    TEST_PDF_PATH,
+    read_test_pdf,
+)
 
-from _responses import DOI, DOI_RESPONSES, ARXIV, ARXIV_RESPONSES, BIBTEX
+# Set to `tests/TEST_REFMAN_DATA` by `conftest.py`, before refman is imported
+REFMAN_DATA = REFMAN_DIR
+
+
+def _first_pdf(root: Path) -> Path:
+    """The first PDF in a paper directory, which all sit one level below `root`."""
+    with os.scandir(root) as dirs:
+        for d in dirs:
+            if d.is_dir():
+                with os.scandir(d.path) as files:
+                    for f in files:
+                        if f.name.endswith(".pdf"):
+                            return Path(f.path)
+    raise StopIteration
 
 
 def clean_refman_data():
-    if REFMAN_DATA.exists():
-        shutil.rmtree(REFMAN_DATA)
+    shutil.rmtree(REFMAN_DATA, ignore_errors=True)
 
 
 @pytest.fixture(autouse=True)
@@ -48,15 +62,25 @@ def start_end():
 
 
 class TestDoi:
-    @responses.activate
-    def test_doi(self):
-        for k, v in DOI_RESPONSES.items():
-            responses.add(responses.GET, k, v, status=200)
-        doi(doi=DOI, key=None, pdf=None)
-        assert pyperclip.paste() == "\\cite{Wasserman_2018}"
-        with pytest.raises(StopIteration):
-            # There should not be any PDF files
-            next(REFMAN_DATA.rglob("*.pdf"))
+    @pytest.mark.parametrize(
+        "key, pdf, expected",
+        [
+            (None, None, "\\cite{Wasserman_2018}"),
+            ("TestKey_2000", None, "\\cite{TestKey_2000}"),
+            (None, str(TEST_PDF_PATH), "\\cite{Wasserman_2018}"),
+        ],
+    )
+    def test_doi(self, mocked_http, key, pdf, expected):
+        doi(doi=DOI, key=key, pdf=pdf)
+        assert pyperclip.paste() == expected
+        if pdf is None:
+            with pytest.raises(StopIteration):
+                # There should not be any PDF files
+                _first_pdf(REFMAN_DATA)
+        else:
+            assert _first_pdf(REFMAN_DATA).read_bytes() == read_test_pdf()
+
+    def test_doi_invalid(self, mocked_http):
         with pytest.raises(ValueError):
             doi(doi="0")
         with pytest.raises(ValueError):
@@ -64,44 +88,81 @@ class TestDoi:
         with pytest.raises(ValueError):
             doi(doi="")
 
-    @responses.activate
-    def test_doi_with_key(self):
-        for k, v in DOI_RESPONSES.items():
-            responses.add(responses.GET, k, v, status=200)
-        doi(doi=DOI, key="TestKey_2000", pdf=None)
-        assert pyperclip.paste() == "\\cite{TestKey_2000}"
-
-    @responses.activate
-    def test_doi_with_pdf(self):
-        for k, v in DOI_RESPONSES.items():
-            responses.add(responses.GET, k, v, status=200)
-        pdf = Path(__file__).parent / "test.pdf"
-        assert pdf.exists()
-        doi(doi=DOI, key=None, pdf=str(pdf))
+    def test_doi_cached(self, mocked_http):
+        doi(doi=DOI, key=None, pdf=None)
+        rm("Wass")
+        doi(doi=DOI, key=None, pdf=None)
+        assert pyperclip.paste() == "\\cite{Wasserman_2018}"
+        # Re-adding the paper should be served from the on-disk cache
+        assert len([c for c in mocked_http.calls if "crossref" in c.request.url]) == 2
+
+
+class TestDois:
+    def test_dois(self, mocked_http):
+        dois(dois=[DOI], file=None)
+        assert pyperclip.paste() == "\\cite{Wasserman_2018}"
+        # The metadata should come from the batched works query
+        assert not any(FMT_CITEPROC in c.request.url for c in mocked_http.calls)
+        # Papers already in the DB are not fetched again
+        dois(dois=[DOI, DOI], file=None)
+        assert pyperclip.paste() == "\\cite{Wasserman_2018,Wasserman_2018}"
+        assert len(list(REFMAN_DATA.glob(f"*/{META_NAME}"))) == 1
+        with pytest.raises(ValueError):
+            dois(dois=[], file=None)
+        with pytest.raises(ValueError):
+            dois(dois=["abcd"], file=None)
+
+    def test_dois_case_insensitive(self, mocked_http):
+        dois(dois=[DOI, DOI.upper()], file=None)
+        assert pyperclip.paste() == "\\cite{Wasserman_2018,Wasserman_2018}"
+        assert len(list(REFMAN_DATA.glob(f"*/{META_NAME}"))) == 1
+
+    def test_dois_invalid(self, mocked_http):
+        with pytest.raises(ValueError):
+            dois(dois=[DOI, "not-a-doi"], file=None)
+        # Nothing should have been requested or written
+        assert len(mocked_http.calls) == 0
+        assert not list(REFMAN_DATA.glob(f"*/{META_NAME}"))
+
+    def test_dois_partial_failure(self, mocked_http):
+        # Nothing is mocked for the second DOI, so adding it fails
+        with pytest.raises(RuntimeError):
+            dois(dois=[DOI, "10.1000/xyz123"], file=None)
+        # The paper that could be added is still in the DB and the bibliography
+        assert RefMan().db["doi"].tolist() == [DOI]
+        assert "Wasserman_2018" in BIB_REF.read_text()
+
+    def test_dois_from_file(self, mocked_http):
+        REFMAN_DATA.mkdir(parents=True, exist_ok=True)
+        doi_file = REFMAN_DATA / "dois.txt"
+        doi_file.write_text(f"{DOI}\n\n{DOI}\n")
+        dois(dois=[], file=doi_file)
+        assert pyperclip.paste() == "\\cite{Wasserman_2018,Wasserman_2018}"
+        assert len(list(REFMAN_DATA.glob(f"*/{META_NAME}"))) == 1
+
+    def test_dois_cached(self, mocked_http):
+        dois(dois=[DOI], file=None)
+        rm("Wass")
+        dois(dois=[DOI], file=None)
         assert pyperclip.paste() == "\\cite{Wasserman_2018}"
-        ref = hashlib.md5(
-            open(Path(__file__).parent / "test.pdf", "rb").read()
-        ).hexdigest()
-        src = hashlib.md5(
-            open(next(REFMAN_DATA.rglob("*.pdf")), "rb").read()
-        ).hexdigest()
-        assert ref == src
+        # The record from the first batch should be served from the on-disk cache
+        assert len([c for c in mocked_http.calls if "works?" in c.request.url]) == 1
 
 
 class TestArxiv:
-    @responses.activate
-    def test_arxiv(self):
-        for k, v in ARXIV_RESPONSES.items():
-            responses.add(responses.GET, k, v, status=200)
-        arxiv(arxiv=ARXIV, key=None)
-        assert pyperclip.paste() == "\\cite{Bronstein_2021}"
-        ref = hashlib.md5(
-            open(Path(__file__).parent / "test.pdf", "rb").read()
-        ).hexdigest()
-        src = hashlib.md5(
-            open(next(REFMAN_DATA.rglob("*.pdf")), "rb").read()
-        ).hexdigest()
-        assert ref == src
+    @pytest.mark.parametrize(
+        "key, expected",
+        [
+            (None, "\\cite{Bronstein_2021}"),
+            ("TestKey_2001", "\\cite{TestKey_2001}"),
+        ],
+    )
+    def test_arxiv(self, mocked_http, key, expected):
+        arxiv(arxiv=ARXIV, key=key)
+        assert pyperclip.paste() == expected
+        assert _first_pdf(REFMAN_DATA).read_bytes() == read_test_pdf()
+
+    def test_arxiv_invalid(self, mocked_http):
         with pytest.raises(ValueError):
             arxiv(arxiv=None, key=None)
         with pytest.raises(ValueError):
@@ -109,48 +170,25 @@ class TestArxiv:
         with pytest.raises(ValueError):
             arxiv(arxiv="abcd.1234", key=None)
 
-    @responses.activate
-    def test_arxiv_with_key(self):
-        for k, v in ARXIV_RESPONSES.items():
-            responses.add(responses.GET, k, v, status=200)
-        arxiv(arxiv=ARXIV, key="TestKey_2001")
-        assert pyperclip.paste() == "\\cite{TestKey_2001}"
-        ref = hashlib.md5(
-            open(Path(__file__).parent / "test.pdf", "rb").read()
-        ).hexdigest()
-        src = hashlib.md5(
-            open(next(REFMAN_DATA.rglob("*.pdf")), "rb").read()
-        ).hexdigest()
-        assert ref == src
-
 
 class TestBibtex:
-    def test_bibtex(self):
-        bibtex(bibtex=BIBTEX, key=None, pdf=None)
-        assert pyperclip.paste() == "\\cite{Wasserman_2018}"
-        with pytest.raises(StopIteration):
-            # There should not be any PDF files
-            next(REFMAN_DATA.rglob("*.pdf"))
-
-    def test_bibtex_with_key(self):
-        bibtex(bibtex=BIBTEX, key="TestKey_2002", pdf=None)
-        assert pyperclip.paste() == "\\cite{TestKey_2002}"
-        with pytest.raises(StopIteration):
-            # There should not be any PDF files
-            next(REFMAN_DATA.rglob("*.pdf"))
-
-    def test_bibtex_with_pdf(self):
-        pdf = Path(__file__).parent / "test.pdf"
-        assert pdf.exists()
-        bibtex(bibtex=BIBTEX, key=None, pdf=pdf)
-        assert pyperclip.paste() == "\\cite{Wasserman_2018}"
-        ref = hashlib.md5(
-            open(Path(__file__).parent / "test.pdf", "rb").read()
-        ).hexdigest()
-        src = hashlib.md5(
-            open(next(REFMAN_DATA.rglob("*.pdf")), "rb").read()
-        ).hexdigest()
-        assert ref == src
+    @pytest.mark.parametrize(
+        "key, pdf, expected",
+        [
+            (None, None, "\\cite{Wasserman_2018}"),
+            ("TestKey_2002", None, "\\cite{TestKey_2002}"),
+            (None, TEST_PDF_PATH, "\\cite{Wasserman_2018}"),
+        ],
+    )
+    def test_bibtex(self, key, pdf, expected):
+        bibtex(bibtex=BIBTEX, key=key, pdf=pdf)
+        assert pyperclip.paste() == expected
+        if pdf is None:
+            with pytest.raises(StopIteration):
+                # There should not be any PDF files
+                _first_pdf(REFMAN_DATA)
+        else:
+            assert _first_pdf(REFMAN_DATA).read_bytes() == read_test_pdf()
 
 
 class TestRekey:
@@ -160,6 +198,14 @@ class TestRekey:
         rekey("Wass", "Rekey_2003")  # Use the wildcard by default
         assert pyperclip.paste() == "\\cite{Rekey_2003}"
 
+    def test_rekey_with_pdf(self):
+        bibtex(bibtex=BIBTEX, key=None, pdf=TEST_PDF_PATH)
+        old_dir = next(REFMAN_DATA.glob("Wasserman_2018_*"))
+        rekey("Wass", "Rekey_2003")
+        assert pyperclip.paste() == "\\cite{Rekey_2003}"
+        assert not old_dir.exists()
+        assert _first_pdf(REFMAN_DATA).read_bytes() == read_test_pdf()
+
 
 class TestRm:
     def test_rm(self):
@@ -168,6 +214,19 @@ class TestRm:
         assert len([f for f in REFMAN_DATA.iterdir() if f.is_dir()]) == 1
         rm("Wass")  # Use the wildcard by default
         assert len([f for f in REFMAN_DATA.iterdir() if f.is_dir()]) == 0
+        assert "Wasserman_2018" not in BIB_REF.read_text()
+
+    def test_rm_by_hand(self):
+        for key in ("Alpha_2000", "Beta_2000"):
+            bibtex(bibtex=BIBTEX, key=key, pdf=None)
+        shutil.rmtree(next(REFMAN_DATA.glob("Alpha_2000_*")))
+        # Notices the missing paper, but doesn't write the bibliography itself
+        RefMan()
+        bibtex(bibtex=BIBTEX, key="Gamma_2000", pdf=None)
+        bib = BIB_REF.read_text()
+        assert "Alpha_2000" not in bib
+        assert "Beta_2000" in bib
+        assert "Gamma_2000" in bib
 
 
 class TestMedit:
@@ -184,13 +243,54 @@ class TestMedit:
         bibtex(bibtex=BIBTEX, key=None, pdf=None)
 
         def dummyfn(*a, **kw):
-            f = next(REFMAN_DATA.rglob("*/.bib"))
-            old_bibtex = open(f, "r").read()
-            new_bibtex = old_bibtex.replace("Wasserman_2018", "TestKey_2004")
-            open(f, "w").write(new_bibtex)
-            print(f, "\n", open(f, "r").read())
+            # Paper directories are named `<key>_<hash>`
+            f = next(REFMAN_DATA.glob(f"Wasserman_2018_*/{BIBTEX_NAME}"))
+            new_bibtex = f.read_text().replace("Wasserman_2018", "TestKey_2004")
+            f.write_text(new_bibtex)
             return 0
 
         monkeypatch.setattr(subprocess, "call", dummyfn)
         medit("Wasser")
         assert pyperclip.paste() == "\\cite{TestKey_2004}"
+
+    def test_medit_whitespace(self, monkeypatch):
+        bibtex(bibtex=BIBTEX, key=None, pdf=None)
+        paper_dir = next(f for f in REFMAN_DATA.iterdir() if f.is_dir())
+
+        def dummyfn(*a, **kw):
+            f = paper_dir / BIBTEX_NAME
+            f.write_text(f.read_text().replace(" = ", "  =  "))
+            return 0
+
+        monkeypatch.setattr(subprocess, "call", dummyfn)
+        medit("Wasser")
+        # Only the formatting changed, so the paper should not have been moved
+        assert paper_dir.exists()
+
+
+class TestDbCache:
+    def test_db_cache_reused(self, monkeypatch):
+        bibtex(bibtex=BIBTEX, key=None, pdf=None)
+
+        def fail(*a, **kw):
+            raise AssertionError("An unchanged paper was read from disk again")
+
+        monkeypatch.setattr(Paper, "parse_meta_only", fail)
+        assert RefMan().db["bibtex_key"].tolist() == ["Wasserman_2018"]
+
+    def test_db_cache_meta_edited(self):
+        bibtex(bibtex=BIBTEX, key=None, pdf=None)
+        meta_path = next(REFMAN_DATA.glob(f"*/{META_NAME}"))
+        meta = json.loads(meta_path.read_text())
+        meta["title"] = "Edited"
+        meta_path.write_text(json.dumps(meta))
+        # Make sure the edit is dated after the cache, whatever the mtime resolution
+        mtime_ns = BIB_DB.stat().st_mtime_ns + 1_000_000_000
+        os.utime(meta_path, ns=(mtime_ns, mtime_ns))
+        assert RefMan().db["title"].tolist() == ["Edited"]
+
+    @pytest.mark.parametrize("contents", ["", "year,title\n", "\x00\xff"])
+    def test_db_cache_unreadable(self, contents):
+        bibtex(bibtex=BIBTEX, key=None, pdf=None)
+        BIB_DB.write_text(contents)
+        assert RefMan().db["bibtex_key"].tolist() == ["Wasserman_2018"]